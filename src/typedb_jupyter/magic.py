@@ -19,9 +19,14 @@
 # under the License.
 #
 
+import datetime
+import decimal
+import functools
+import math
+import numbers
 import re
 from traitlets.config.configurable import Configurable
-from traitlets import Bool
+from traitlets import Bool, Integer
 from IPython.core.magic import Magics, cell_magic, line_magic, magics_class, needs_local_scope
 from IPython.core.magic_arguments import argument, magic_arguments, parse_argstring
 from typedb.api.connection.credential import TypeDBCredential
@@ -31,26 +36,83 @@ from typedb_jupyter.query import Query
 from typedb_jupyter.exception import ArgumentError, QueryParsingError
 
 
+_TEMPLATE_TOKEN = re.compile(
+    r"\"(?:[^\"\\]|\\.)*(?:\"|\Z)"     # Double-quoted string literal, possibly unterminated.
+    r"|'(?:[^'\\]|\\.)*(?:'|\Z)"       # Single-quoted string literal, possibly unterminated.
+    r"|#[^\n]*"                        # Comment.
+    r"|\{([A-Za-z_][A-Za-z0-9_]*)\}",  # Variable placeholder.
+    re.DOTALL
+)
+
+
+@functools.lru_cache(maxsize=256)
+def compile_template(query):
+    chunks = list()
+    var_names = list()
+    chunk_start = 0
+
+    for match in _TEMPLATE_TOKEN.finditer(query):
+        if match.group(1) is not None:
+            chunks.append(query[chunk_start:match.start()])
+            var_names.append(match.group(1))
+            chunk_start = match.end()
+
+    chunks.append(query[chunk_start:])
+    return tuple(chunks), tuple(var_names)
+
+
+def format_value(val):
+    if isinstance(val, str):
+        return "\"{}\"".format(val.replace("\\", "\\\\").replace("\"", "\\\""))
+    elif isinstance(val, bool) or (type(val).__module__ == "numpy" and type(val).__name__ in ("bool", "bool_")):
+        # Also matches NumPy booleans, which are not bool or numbers.Integral instances.
+        return "true" if val else "false"
+    elif isinstance(val, numbers.Integral):
+        return str(int(val))
+    elif isinstance(val, numbers.Real):
+        val = float(val)
+
+        if not math.isfinite(val):
+            raise QueryParsingError("Cannot substitute non-finite number into query: {}".format(val))
+
+        # TypeQL has no exponent notation, so expand the shortest round-tripping representation.
+        literal = format(decimal.Decimal(repr(val)), "f")
+        return literal if "." in literal else literal + ".0"
+    elif isinstance(val, decimal.Decimal):
+        if not val.is_finite():
+            raise QueryParsingError("Cannot substitute non-finite number into query: {}".format(val))
+
+        literal = format(val, "f")
+        return literal if "." in literal else literal + ".0"
+    elif isinstance(val, datetime.datetime):
+        if val.tzinfo is not None:
+            val = val.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+        return val.isoformat(timespec="milliseconds" if val.microsecond else "seconds")
+    elif isinstance(val, datetime.date):
+        return val.isoformat()
+    else:
+        raise QueryParsingError("Cannot substitute value of unsupported type into query: {}".format(type(val).__name__))
+
+
 def substitute_vars(query, local_ns):
-    try:
-        query_vars = "".join(query.split("\"")[::2]).replace("{", "}").split("}")[1::2]
-    except IndexError:
+    chunks, var_names = compile_template(query)
+
+    if not var_names:
         return query
 
-    for var in query_vars:
+    rendered = [chunks[0]]
+
+    for var, chunk in zip(var_names, chunks[1:]):
         try:
             val = local_ns[var]
         except KeyError:
             raise QueryParsingError("No variable found in local namespace with name: {}".format(var))
 
-        if type(val) is str:
-            val = "\"{}\"".format(val.replace("\"", "'"))
-        else:
-            val = str(val)
-
-        query = query.replace("{" + var + "}", val)
+        rendered.append(format_value(val))
+        rendered.append(chunk)
 
-    return query
+    return "".join(rendered)
 
 
 @magics_class
@@ -137,6 +199,23 @@ class TypeQLMagic(Magics, Configurable):
         config=True,
         help="Enable rule inference for all queries. Can be overridden per query with -i."
     )
+    global_prefetch = Bool(
+        True,
+        config=True,
+        help="Enable answer prefetching for all queries. Can be overridden per query with -p."
+    )
+    global_prefetch_size = Integer(
+        None,
+        allow_none=True,
+        min=1,
+        config=True,
+        help="Prefetch size for all queries, or None to use the driver default. Can be overridden per query with -b."
+    )
+    adaptive_prefetch = Bool(
+        False,
+        config=True,
+        help="Tune prefetch size for all queries from previous runs of the same query. Can be overridden per query with -b."
+    )
 
     @needs_local_scope
     @line_magic("typeql")
@@ -146,6 +225,8 @@ class TypeQLMagic(Magics, Configurable):
     @argument("-r", "--result", type=str, help="Assign query result to the named variable instead of printing.")
     @argument("-f", "--file", type=str, help="Read in query from a TypeQL file at the specified path.")
     @argument("-i", "--inference", type=bool, help="Enable (True) or disable (False) rule inference for query.")
+    @argument("-p", "--prefetch", type=str, help="Enable (True) or disable (False) answer prefetching for query.")
+    @argument("-b", "--prefetch-size", type=str, help="Set prefetch size for query, or 'auto' to tune it from previous runs of the same query.")
     @argument("-s", "--session", type=str, help="Force a particular session type for query, 'schema' or 'data'.")
     @argument("-t", "--transaction", type=str, help="Force a particular transaction type for query, 'read' or 'write'.")
     def execute(self, line="", cell="", local_ns=None):
@@ -168,7 +249,10 @@ class TypeQLMagic(Magics, Configurable):
             raise ArgumentError("No query string supplied.")
 
         connection = Connection.get()
-        query = Query(query, args.session, args.transaction, args.inference, self.strict_transactions, self.global_inference)
+        query = Query(
+            query, args.session, args.transaction, args.inference, args.prefetch, args.prefetch_size,
+            self.strict_transactions, self.global_inference, self.global_prefetch, self.global_prefetch_size, self.adaptive_prefetch
+        )
         result = query.run(connection, self.show_info)
 
         if args.result:
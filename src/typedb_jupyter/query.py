@@ -19,7 +19,10 @@
 # under the License.
 #
 
+import collections
 import math
+import re
+import time
 from typedb.client import TypeDBOptions
 from typedb.api.connection.session import SessionType
 from typedb.api.connection.transaction import TransactionType
@@ -32,7 +35,20 @@ from typedb_jupyter.exception import ArgumentError, QueryParsingError
 
 
 class Query(object):
-    def __init__(self, query, session_arg, transaction_arg, inference_arg, strict_transactions, global_inference):
+    # Running answer statistics for each query shape, used to tune the prefetch size in adaptive mode.
+    shape_stats = collections.OrderedDict()
+
+    STREAMED_QUERY_TYPES = ("match", "match-group")
+    MAX_SHAPES = 256
+    SINGLE_BATCH_PREFETCH_SIZE = 1000
+    MAX_PREFETCH_SIZE = 10000
+    TARGET_BATCH_SECONDS = 0.05
+    STATS_SMOOTHING = 0.5
+
+    _LITERAL = re.compile(r"[+-]?[0-9.]+(e[+-]?[0-9]+)?|[0-9]{4}-[0-9]{2}-[0-9]{2}(T[0-9:.]+)?|true|false")
+
+    def __init__(self, query, session_arg, transaction_arg, inference_arg, prefetch_arg, prefetch_size_arg,
+                 strict_transactions, global_inference, global_prefetch, global_prefetch_size, adaptive_prefetch):
         self.query = query
         self.query_type = self._get_query_type(self.query)
         self.session_type = self._get_session_type(self.query_type, session_arg, strict_transactions)
@@ -43,6 +59,11 @@ class Query(object):
         else:
             self.infer = inference_arg
 
+        self.prefetch = self._get_prefetch(prefetch_arg, global_prefetch)
+        self.prefetch_size, self.adaptive = self._get_prefetch_size(prefetch_size_arg, global_prefetch_size, adaptive_prefetch)
+        self.prefetch_size_source = "default"
+        self.query_shape = None
+
     @staticmethod
     def _get_query_args(query):
         # Warning: This method is experimental and not guaranteed to always function correctly. Copy at your own risk.
@@ -197,11 +218,112 @@ class Query(object):
             else:
                 raise ArgumentError("Incorrect transaction type provided. Transaction type must be 'read' or 'write'.")
 
+    @staticmethod
+    def _get_prefetch(prefetch_arg, global_prefetch):
+        if prefetch_arg is None:
+            return global_prefetch
+        elif prefetch_arg.lower() == "true":
+            return True
+        elif prefetch_arg.lower() == "false":
+            return False
+        else:
+            raise ArgumentError("Incorrect prefetch option provided. Prefetch option must be 'True' or 'False'.")
+
+    @staticmethod
+    def _get_prefetch_size(prefetch_size_arg, global_prefetch_size, adaptive_prefetch):
+        if prefetch_size_arg is None:
+            if adaptive_prefetch:
+                return global_prefetch_size, True
+            else:
+                prefetch_size = global_prefetch_size
+        elif prefetch_size_arg.lower() == "auto":
+            return global_prefetch_size, True
+        else:
+            try:
+                prefetch_size = int(prefetch_size_arg)
+            except ValueError:
+                raise ArgumentError("Incorrect prefetch size provided. Prefetch size must be a positive integer or 'auto'.")
+
+        if prefetch_size is not None and prefetch_size < 1:
+            raise ArgumentError("Incorrect prefetch size provided. Prefetch size must be a positive integer or 'auto'.")
+
+        return prefetch_size, False
+
+    def _get_query_shape(self, connection):
+        # String literals and comments are already blanked out by the argument parser, so only numeric, datetime, and
+        # boolean literals need masking. Limit and offset values are kept, as they determine the number of answers.
+        query_args = list()
+        previous_arg = None
+
+        for arg in self._get_query_args(self.query):
+            if previous_arg not in ("limit", "offset") and self._LITERAL.fullmatch(arg):
+                query_args.append("?")
+            else:
+                query_args.append(arg)
+
+            previous_arg = arg
+
+        return connection.name, self.query_type, tuple(query_args)
+
+    @classmethod
+    def _get_adaptive_prefetch_size(cls, shape):
+        try:
+            expected_answers, answers_per_second = cls.shape_stats[shape]
+        except KeyError:
+            return None
+
+        cls.shape_stats.move_to_end(shape)
+
+        # Fetch a small result in a single batch. Throughput is only used to grow the batches of a large result, as it
+        # includes query planning and inference time and depends on the prefetch size previously used.
+        if expected_answers + 1 <= cls.SINGLE_BATCH_PREFETCH_SIZE:
+            return int(expected_answers + 1)
+        else:
+            prefetch_size = answers_per_second * cls.TARGET_BATCH_SECONDS
+            return int(max(cls.SINGLE_BATCH_PREFETCH_SIZE, min(cls.MAX_PREFETCH_SIZE, prefetch_size)))
+
+    @classmethod
+    def _record_answers(cls, shape, answer_count, duration):
+        answers_per_second = answer_count / max(duration, 1e-6)
+
+        if shape in cls.shape_stats:
+            previous_answers, previous_answers_per_second = cls.shape_stats[shape]
+            answer_count = cls.STATS_SMOOTHING * answer_count + (1 - cls.STATS_SMOOTHING) * previous_answers
+            answers_per_second = cls.STATS_SMOOTHING * answers_per_second + (1 - cls.STATS_SMOOTHING) * previous_answers_per_second
+
+        cls.shape_stats[shape] = (answer_count, answers_per_second)
+        cls.shape_stats.move_to_end(shape)
+
+        if len(cls.shape_stats) > cls.MAX_SHAPES:
+            cls.shape_stats.popitem(last=False)
+
     def _get_options(self, connection):
         if connection.client.is_cluster():
-            return TypeDBOptions().cluster().set_infer(self.infer)
+            options = TypeDBOptions().cluster()
         else:
-            return TypeDBOptions().core().set_infer(self.infer)
+            options = TypeDBOptions().core()
+
+        options.set_infer(self.infer)
+        options.set_prefetch(self.prefetch)
+
+        if self.adaptive and self.prefetch and self.query_type in self.STREAMED_QUERY_TYPES:
+            self.query_shape = self._get_query_shape(connection)
+            adaptive_prefetch_size = self._get_adaptive_prefetch_size(self.query_shape)
+
+            if adaptive_prefetch_size is not None:
+                self.prefetch_size = adaptive_prefetch_size
+                self.prefetch_size_source = "adaptive"
+            elif self.prefetch_size is not None:
+                self.prefetch_size_source = "fixed, adaptive with no history"
+            else:
+                self.prefetch_size_source = "default, adaptive with no history"
+        elif self.prefetch_size is not None:
+            self.prefetch_size_source = "fixed"
+
+        if self.prefetch_size is not None:
+            options.set_prefetch_size(self.prefetch_size)
+
+        return options
 
     def _print_info(self, connection):
         connection_arg = "Connection: {}".format(connection.verbose_name)
@@ -223,8 +345,15 @@ class Query(object):
         else:
             inference_arg = "Inference: off"
 
-        info = "{}\n{}\n{}\n{}\n{}".format(
-            connection_arg, session_arg, transaction_arg, query_arg, inference_arg
+        if not self.prefetch:
+            prefetch_arg = "Prefetch: off"
+        elif self.prefetch_size is None:
+            prefetch_arg = "Prefetch: on, size {}".format(self.prefetch_size_source)
+        else:
+            prefetch_arg = "Prefetch: on, size {} ({})".format(self.prefetch_size, self.prefetch_size_source)
+
+        info = "{}\n{}\n{}\n{}\n{}\n{}".format(
+            connection_arg, session_arg, transaction_arg, query_arg, inference_arg, prefetch_arg
         )
 
         print(info)
@@ -269,6 +398,8 @@ class Query(object):
 
         try:
             with connection.session.transaction(self.transaction_type, options) as transaction:
+                start_time = time.perf_counter()
+
                 if self.query_type == "match":
                     results = self._parse_answer(transaction.query().match(self.query), ConceptMap)
                 elif self.query_type == "match-aggregate":
@@ -288,6 +419,10 @@ class Query(object):
                 elif self.query_type == "update":
                     transaction.query().update(self.query)
 
+                if self.query_shape is not None:
+                    # Group answers are streamed one per group, so the answer count is the number of groups.
+                    self._record_answers(self.query_shape, len(results), time.perf_counter() - start_time)
+
                 if self.transaction_type == TransactionType.WRITE:
                     transaction.commit()
                     print('{} query success.'.format(self.query_type.title()))